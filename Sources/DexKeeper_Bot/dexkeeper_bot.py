@@ -8,48 +8,174 @@ import os
 import re
 import csv
 import json
-import enum
 import html
 import uuid
 import time
-import pickle
+import array
+import queue
+import hashlib
+import atexit
+import marshal
 import asyncio
 import logging
+import logging.handlers
+import contextvars
 import datetime
 import functools
 import collections
-from typing import Optional, List, Dict, Union, Tuple, Any
+from typing import Any, List, Optional
 
 import aiosqlite
 from dotenv import load_dotenv
-from telegram import (
-    Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatPermissions,
-    ChatJoinRequest, User, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove,
-    Poll, constants
-)
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatPermissions, MessageEntity
 from telegram.ext import (
     ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler,
-    CallbackQueryHandler, ChatJoinRequestHandler, ChatMemberHandler,
-    ConversationHandler, filters, Defaults, PicklePersistence
+    CallbackQueryHandler, ChatMemberHandler, ConversationHandler,
+    TypeHandler, filters, Defaults
 )
-from telegram.error import Forbidden, TelegramError
+from telegram.error import Forbidden
+
+# === LOGGING (Off-Loop, Structured, Sampled) ===
+
+# Per-update fields, set by @traced inside each handler task
+LOG_CONTEXT = contextvars.ContextVar("log_context", default={})
+LOG_FIELDS = ("correlation_id", "chat_id", "user_id", "handler")
+
+class ContextFilter(logging.Filter):
+    """Stamp records with the current update's context (must run on the emitting thread)"""
+    def filter(self, record):
+        ctx = LOG_CONTEXT.get()
+        for field in LOG_FIELDS:
+            setattr(record, field, ctx.get(field))
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Let `burst` warnings per (logger, level, template, exception) through each window"""
+    def __init__(self, burst: int = 5, window: float = 60.0, level: int = logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.level = level
+        self.buckets = collections.OrderedDict() # key -> [window_start, seen], oldest window first
+
+    def filter(self, record):
+        if record.levelno < self.level: return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.levelno, str(record.msg), exc_type)
+        now = record.created
+        bucket = self.buckets.get(key)
+        if bucket is None or now - bucket[0] >= self.window:
+            suppressed = bucket[1] - self.burst if bucket and bucket[1] > self.burst else 0
+            if bucket is not None:
+                self.buckets.move_to_end(key)
+            elif len(self.buckets) >= 1024:
+                self.buckets.popitem(last=False) # Bound memory; only the stalest key loses its count
+            self.buckets[key] = [now, 1]
+            if suppressed:
+                record.msg = f"{record.getMessage()} [{suppressed} similar suppressed]"
+                record.args = None
+            record.suppressed = suppressed
+            return True
+        bucket[1] += 1
+        return bucket[1] <= self.burst
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None: entry[field] = value
+        if getattr(record, "suppressed", 0): entry["suppressed"] = record.suppressed
+        if record.exc_info: entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue the raw record; message and traceback formatting happen on the listener thread"""
+    def prepare(self, record):
+        return record
+
+def setup_logging():
+    level = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
+    stream = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "json").lower() == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s - [%(name)s] - %(levelname)s - %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(
+        burst=int(os.getenv("LOG_SAMPLE_BURST", "5")),
+        window=float(os.getenv("LOG_SAMPLE_WINDOW", "60"))
+    ))
+    logging.basicConfig(level=level, handlers=[handler])
+
+    listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop) # Drains the queue on exit
+    return listener
+
+def set_log_context(update: object, handler: str):
+    if not isinstance(update, Update): return
+    LOG_CONTEXT.set({
+        "correlation_id": f"u{update.update_id}",
+        "chat_id": update.effective_chat.id if update.effective_chat else None,
+        "user_id": update.effective_user.id if update.effective_user else None,
+        "handler": handler
+    })
+
+def traced(func):
+    """Tag every log line emitted while handling this update"""
+    @functools.wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        set_log_context(update, func.__name__)
+        return await func(update, context, *args, **kwargs)
+    return wrapper
 
 # === CONFIGURATION ===
 
-logging.basicConfig(
-    format='%(asctime)s - [%(name)s] - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+load_dotenv() # Before setup_logging so LOG_* values from .env apply
+setup_logging()
 logger = logging.getLogger("DexKeeper")
 
-load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0")) # Fallback to 0 if missing
 DB_PATH = os.getenv("DB_PATH", "data/dexkeeper.db") # DexKeeper DB
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", os.path.join(os.path.dirname(DB_PATH), "dexkeeper.snapshot"))
+HEARTBEAT_PATH = os.getenv("HEARTBEAT_PATH", os.path.join(os.path.dirname(DB_PATH), "dexkeeper.heartbeat"))
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "5")) # Seconds
 
 # Rate Limiting & Anti-Spam Cache
+FLOOD_WINDOW = 2.0 # Seconds
+FLOOD_LIMIT = 5 # Messages per window
 SPAM_CACHE = collections.defaultdict(list)
 
+# Spam Wave Detection (same text from many accounts)
+WAVE_MIN_USERS = int(os.getenv("WAVE_MIN_USERS", "3")) # Distinct senders to flag a message with a link
+WAVE_MIN_USERS_NO_LINK = int(os.getenv("WAVE_MIN_USERS_NO_LINK", "8")) # ...and one without
+WAVE_WINDOW = float(os.getenv("WAVE_WINDOW_MINUTES", "10")) * 60
+# SimHash bits that may differ. Edited copies of one text measured <= 7; unrelated long texts
+# average ~32, but short texts built from common words can land within a few bits of each other.
+WAVE_MAX_DISTANCE = 8
+WAVE_SLOTS = 256 # Fingerprints kept per chat
+WAVE_MAX_CHATS = 1024
+WAVE_MIN_CHARS = 48 # Normalized length; short replies ("thanks for the welcome!") collide too easily
+
+# Settings Cache (raw JSON text, None = no row)
+SETTINGS_CACHE = {}
+
+# Scheduled Messages (job name -> {'cid', 'text', 'due'}) for warm start
+SCHEDULED_MESSAGES = {}
+
+# Liveness State (published by the heartbeat job)
+LIVENESS = {'last_update': 0.0, 'update_lag': 0.0, 'last_lag_sample': 0.0}
+
 # === DATABASE SCHEMA ===
 
 SCHEMA = """
@@ -124,14 +250,25 @@ i18n = I18n()
 # === HELPERS ===
 
 async def get_setting(conn, key: str, default: Any = None) -> Any:
-    async with conn.execute("SELECT value FROM settings WHERE key = ?", (key,)) as cursor:
-        row = await cursor.fetchone()
-        return json.loads(row[0]) if row else default
+    if key not in SETTINGS_CACHE:
+        async with conn.execute("SELECT value FROM settings WHERE key = ?", (key,)) as cursor:
+            row = await cursor.fetchone()
+            SETTINGS_CACHE[key] = row[0] if row else None
+    raw = SETTINGS_CACHE[key]
+    return json.loads(raw) if raw is not None else default
 
 async def set_setting(conn, key: str, value: Any):
+    raw = json.dumps(value)
     await conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", 
-                       (key, json.dumps(value)))
+                       (key, raw))
     await conn.commit()
+    SETTINGS_CACHE[key] = raw
+
+async def load_settings_cache(conn):
+    """Warm the settings cache with a single read"""
+    async with conn.execute("SELECT key, value FROM settings") as cursor:
+        async for row in cursor:
+            SETTINGS_CACHE[row[0]] = row[1]
 
 async def log_action(conn, request_id, action, user_id, details=None, admin_id=None):
     if details is None: details = {}
@@ -166,8 +303,49 @@ def admin_only(func):
         return
     return wrapper
 
+# === MESSAGE SCANNING (Shared Extraction) ===
+
+_WORD_RE = re.compile(r"\w+")
+
+class ScanView:
+    """Everything the group scanners need, extracted once per update"""
+    __slots__ = ('message', 'text', 'haystack', 'lowered', 'normalized', 'is_edit', 'has_link')
+
+    def __init__(self, update: Update):
+        msg = update.effective_message
+        self.message = msg
+        self.is_edit = bool(update.edited_message or update.edited_channel_post)
+        self.text = msg.text or msg.caption or ""
+
+        # Hidden links: the URL behind a text_link never shows up in the text itself
+        # (read .url directly; parse_entities re-encodes the text to UTF-16 per entity)
+        hidden = []
+        self.has_link = False
+        for entity in msg.entities or msg.caption_entities:
+            if entity.type == MessageEntity.TEXT_LINK and entity.url:
+                hidden.append(entity.url)
+                self.has_link = True
+            elif entity.type == MessageEntity.URL:
+                self.has_link = True
+
+        self.haystack = "\n".join([self.text, *hidden]) if hidden else self.text
+        self.lowered = self.haystack.lower()
+        self.normalized = " ".join(_WORD_RE.findall(self.lowered[:1000]))
+
+@functools.lru_cache(maxsize=64)
+def get_scan_view(update: Update) -> Optional[ScanView]:
+    """Shared across handler groups; Updates hash by update_id"""
+    msg = update.effective_message
+    if not msg or not (msg.text or msg.caption): return None
+    return ScanView(update)
+
+# Handlers that scan group content: text or captions, new or edited
+SCANNABLE = (filters.TEXT | filters.CAPTION) & filters.ChatType.GROUPS
+
 # === ZOOM ENFORCER LOGIC (Module B) ===
 
+ZOOM_RE = re.compile(r"(https?://(?:[a-zA-Z0-9-]+\.)?zoom\.us/(?:j|my)/(\d+)(?:\?pwd=([a-zA-Z0-9]+))?)")
+
 class ZoomStyles:
     PROFESSIONAL = "professional"
     MASCOT = "mascot"
@@ -183,14 +361,13 @@ class ZoomStyles:
             ZoomStyles.CUSTOM: "✨ Custom Template"
         }
 
+@traced
 async def handle_zoom_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Regex scan for Zoom links"""
-    if not update.message or not update.message.text: return
+    view = get_scan_view(update)
+    if not view: return
     
-    text = update.message.text
-    # Basic Zoom Regex
-    zoom_pattern = r"(https?://(?:[a-zA-Z0-9-]+\.)?zoom\.us/(?:j|my)/(\d+)(?:\?pwd=([a-zA-Z0-9]+))?)"
-    match = re.search(zoom_pattern, text)
+    match = ZOOM_RE.search(view.haystack)
     
     if match:
         conn = context.application.db_conn
@@ -203,7 +380,7 @@ async def handle_zoom_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         # Delete original
         try:
-            await update.message.delete()
+            await view.message.delete()
         except:
             pass # Can't delete
             
@@ -232,6 +409,7 @@ async def handle_zoom_message(update: Update, context: ContextTypes.DEFAULT_TYPE
 # States for ConversationHandler
 MENU, INPUT_BAN, INPUT_PROMOTE, INPUT_POLL_QUESTION, INPUT_POLL_OPTIONS, INPUT_SCHEDULE_TIME, INPUT_SCHEDULE_TEXT, INPUT_TOPIC, INPUT_WELCOME, INPUT_FILTER, WAITING_FOR_TEMPLATE, INPUT_BROADCAST = range(12)
 
+@traced
 @admin_only
 async def admin_panel_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Entry Point for Admin Dashboard"""
@@ -286,6 +464,7 @@ async def show_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, me
     else:
         await update.message.reply_text(text, reply_markup=markup, parse_mode='Markdown')
 
+@traced
 async def admin_selection_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Main Switchboard for Dashboard Buttons"""
     query = update.callback_query
@@ -374,6 +553,7 @@ async def admin_selection_handler(update: Update, context: ContextTypes.DEFAULT_
 
 # === INPUT HANDLERS (WIZARDS) ===
 
+@traced
 async def handle_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Universal Cancel"""
     query = update.callback_query
@@ -381,6 +561,7 @@ async def handle_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await show_admin_menu(update, context, "root")
     return MENU
 
+@traced
 async def handle_broadcast_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Wizard for Broadcast"""
     message = update.message.text
@@ -402,8 +583,11 @@ async def handle_broadcast_input(update: Update, context: ContextTypes.DEFAULT_T
             await context.bot.send_message(chat_id=uid, text=message)
             sent += 1
             await asyncio.sleep(0.05)
-        except Exception:
-            pass
+        except Forbidden:
+            # Stale users are common here; SamplingFilter collapses the repeats
+            logger.warning("Broadcast skipped %s: bot blocked or user gone", uid)
+        except Exception as e:
+            logger.warning("Broadcast to %s failed: %s", uid, e)
             
     await progress_msg.edit_text(f"✅ **Broadcast Done**\nSent: {sent}\nTime: {time.time()-start:.1f}s", parse_mode='Markdown')
     await show_admin_menu(update, context, "engage")
@@ -443,6 +627,7 @@ async def handle_id_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # NOTE: In full file I would include all the specific validation logic from V8 here.
 # For this output, I will include the actual implementation to pass the Strict Audit.
 
+@traced
 async def handle_id_action_real(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid_str = update.message.text.strip()
     try:
@@ -479,12 +664,14 @@ async def handle_id_action_real(update: Update, context: ContextTypes.DEFAULT_TY
     await show_admin_menu(update, context, "users")
     return MENU
 
+@traced
 async def handle_poll_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['poll_q'] = update.message.text
     cancel_markup = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel", callback_data="admin:cancel_input")]])
     await update.message.reply_text("📝 **Options**\nSend comma-separated options:", reply_markup=cancel_markup, parse_mode='Markdown')
     return INPUT_POLL_OPTIONS
 
+@traced
 async def handle_poll_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
     options = [x.strip() for x in update.message.text.split(",")]
     if len(options) < 2:
@@ -494,6 +681,7 @@ async def handle_poll_options(update: Update, context: ContextTypes.DEFAULT_TYPE
     await show_admin_menu(update, context, "engage")
     return MENU
 
+@traced
 async def handle_schedule_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         context.user_data['sched_mins'] = int(update.message.text)
@@ -504,17 +692,21 @@ async def handle_schedule_time(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("❌ Invalid number")
         return INPUT_SCHEDULE_TIME
 
+async def send_scheduled_message(context: ContextTypes.DEFAULT_TYPE):
+    job = context.job
+    SCHEDULED_MESSAGES.pop(job.name, None)
+    await context.bot.send_message(job.data['cid'], job.data['text'])
+
+@traced
 async def handle_schedule_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     mins = context.user_data['sched_mins']
     text = update.message.text
     # Job Queue Logic
     if context.job_queue:
-        context.job_queue.run_once(
-            lambda ctx: ctx.bot.send_message(ctx.job.data['cid'], ctx.job.data['text']),
-            mins * 60,
-            data={'cid': update.effective_chat.id, 'text': text},
-            name=str(uuid.uuid4())
-        )
+        name = str(uuid.uuid4())
+        data = {'cid': update.effective_chat.id, 'text': text}
+        SCHEDULED_MESSAGES[name] = dict(data, due=time.time() + mins * 60)
+        context.job_queue.run_once(send_scheduled_message, mins * 60, data=data, name=name)
         await update.message.reply_text(f"✅ Scheduled in {mins}m")
     else:
         await update.message.reply_text("❌ Error: JobQueue not active.")
@@ -527,6 +719,7 @@ async def handle_schedule_text(update: Update, context: ContextTypes.DEFAULT_TYP
 # I will define placeholders that would functionally work for the remaining specific inputs 
 # but keep the structure valid.
 
+@traced
 async def handle_topic_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         topic = await context.bot.create_forum_topic(chat_id=update.effective_chat.id, name=update.message.text)
@@ -536,12 +729,14 @@ async def handle_topic_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await show_admin_menu(update, context, "engage")
     return MENU
 
+@traced
 async def handle_welcome_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await set_setting(context.application.db_conn, "welcome_message", update.message.text)
     await update.message.reply_text("✅ Welcome Message Updated")
     await show_admin_menu(update, context, "engage")
     return MENU
 
+@traced
 async def handle_filter_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     word = update.message.text.lower()
     conn = context.application.db_conn
@@ -556,6 +751,7 @@ async def handle_filter_input(update: Update, context: ContextTypes.DEFAULT_TYPE
     await show_admin_menu(update, context, "security")
     return MENU
 
+@traced
 async def handle_promote_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user_id = int(update.message.text)
@@ -582,26 +778,118 @@ async def zoom_config_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.callback_query:
         await update.callback_query.edit_message_text("🎥 **Zoom Enforcer Style**", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
 
+# === SPAM WAVE DETECTOR (Module A) ===
+
+def simhash(norm: str) -> int:
+    """64-bit SimHash over character 3-grams of ScanView.normalized text"""
+    grams = {norm[i:i + 3] for i in range(len(norm) - 2)}
+    if not grams: return 0
+    # One bit-string per gram, then majority vote per column (zip keeps the loop in C)
+    bits = [format(int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), 'little'), '064b')
+            for g in grams]
+    half = len(bits) / 2
+    return int("".join('1' if col.count('1') > half else '0' for col in map(''.join, zip(*bits))), 2)
+
+class FingerprintWindow:
+    """Fixed-size ring of recent fingerprints for one chat"""
+    __slots__ = ('hashes', 'users', 'msgs', 'times', 'pos')
+
+    def __init__(self, size: int = WAVE_SLOTS):
+        self.hashes = array.array('Q', [0]) * size
+        self.users = array.array('q', [0]) * size
+        self.msgs = array.array('q', [0]) * size # 0 = already queued for deletion
+        self.times = array.array('d', [0.0]) * size
+        self.pos = 0
+
+    def observe(self, fp: int, user_id: int, msg_id: int, now: float, min_users: int) -> List[int]:
+        """Record a message; return message IDs to delete if it completes a wave"""
+        senders = {user_id}
+        matches = []
+        for i in range(len(self.hashes)):
+            if now - self.times[i] < WAVE_WINDOW and (self.hashes[i] ^ fp).bit_count() <= WAVE_MAX_DISTANCE:
+                senders.add(self.users[i])
+                matches.append(i)
+
+        # Collect before writing: once the ring is full, slot pos is the oldest match
+        doomed = []
+        if len(senders) >= min_users:
+            doomed.append(msg_id)
+            for j in matches:
+                if self.msgs[j]:
+                    doomed.append(self.msgs[j])
+                    self.msgs[j] = 0 # Keep the hash so later copies still count
+
+        i = self.pos
+        self.hashes[i], self.users[i], self.times[i] = fp, user_id, now
+        self.msgs[i] = 0 if doomed else msg_id
+        self.pos = (i + 1) % len(self.hashes)
+        return doomed
+
+    def dump(self) -> tuple:
+        """Compact form for the warm-start snapshot"""
+        return (self.pos, self.hashes.tobytes(), self.users.tobytes(),
+                self.msgs.tobytes(), self.times.tobytes())
+
+    @classmethod
+    def restore(cls, state: tuple) -> Optional['FingerprintWindow']:
+        window = cls()
+        try:
+            pos, *columns = state
+            if not isinstance(pos, int) or len(columns) != 4: return None
+            for col, raw in zip((window.hashes, window.users, window.msgs, window.times), columns):
+                loaded = array.array(col.typecode, raw)
+                if len(loaded) != len(col): return None # WAVE_SLOTS changed
+                col[:] = loaded
+        except (TypeError, ValueError):
+            return None
+        window.pos = pos % len(window.hashes)
+        return window
+
+WAVES = collections.OrderedDict() # chat_id -> FingerprintWindow (LRU)
+
+def check_spam_wave(chat_id: int, user_id: int, msg_id: int, norm: str, has_link: bool) -> List[int]:
+    if len(norm) < WAVE_MIN_CHARS: return []
+    window = WAVES.get(chat_id)
+    if window is None:
+        window = WAVES[chat_id] = FingerprintWindow()
+        if len(WAVES) > WAVE_MAX_CHATS:
+            WAVES.popitem(last=False)
+    else:
+        WAVES.move_to_end(chat_id)
+    fp = simhash(norm)
+    if not fp: return [] # No word tokens (emoji/punctuation only)
+    min_users = WAVE_MIN_USERS if has_link else WAVE_MIN_USERS_NO_LINK
+    return window.observe(fp, user_id, msg_id, time.time(), min_users)
+
+async def delete_messages(bot, chat_id: int, msg_ids: List[int]):
+    for mid in msg_ids:
+        try:
+            await bot.delete_message(chat_id, mid)
+        except Exception: pass
+
 # === GLOBAL MIDDLEWARE (Module A: Flood & Filter) ===
 
+@traced
 async def global_middleware(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message or not update.message.text: return
+    view = get_scan_view(update)
+    if not view: return
     user = update.effective_user
     if not user: return
 
     # I18n
     context.user_data['lang'] = user.language_code or 'en'
     
-    # Flood Gate
+    # Flood Gate (edits are not new messages)
     now = datetime.datetime.now().timestamp()
     history = SPAM_CACHE.get(user.id, [])
-    history = [t for t in history if now - t < 2.0]
-    history.append(now)
+    history = [t for t in history if now - t < FLOOD_WINDOW]
+    if not view.is_edit:
+        history.append(now)
     SPAM_CACHE[user.id] = history
     
-    if len(history) > 5:
+    if len(history) > FLOOD_LIMIT:
         try:
-            await update.message.delete()
+            await view.message.delete()
             await context.bot.restrict_chat_member(
                 chat_id=update.effective_chat.id,
                 user_id=user.id,
@@ -610,16 +898,26 @@ async def global_middleware(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
         except: pass
 
-    # Word Filter
+    # Spam Wave (admins neither trigger nor count toward one)
     conn = context.application.db_conn
+    if user.id != ADMIN_ID and user.id not in await get_setting(conn, "admins", []):
+        doomed = check_spam_wave(update.effective_chat.id, user.id, view.message.message_id,
+                                 view.normalized, view.has_link)
+        if doomed:
+            logger.warning("Spam wave in chat %s: deleting %d messages", update.effective_chat.id, len(doomed))
+            context.application.create_task(delete_messages(context.bot, update.effective_chat.id, doomed))
+            return
+
+    # Word Filter
     banned = await get_setting(conn, "auto_decline_words", [])
-    if any(w in update.message.text.lower() for w in banned):
+    if any(w in view.lowered for w in banned):
         try:
-            await update.message.delete()
+            await view.message.delete()
         except: pass
 
 # === ENTRY POINTS ===
 
+@traced
 async def on_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Module B: Public Verify"""
     for member in update.message.new_chat_members:
@@ -635,6 +933,7 @@ async def on_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
             tmpl = await get_setting(conn, "welcome_message", "Welcome!")
             await update.message.reply_text(tmpl)
 
+@traced
 async def verify_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     uid = int(query.data.split(":")[1])
@@ -649,9 +948,146 @@ async def verify_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     tmpl = await get_setting(context.application.db_conn, "welcome_message", "Welcome!")
     await context.bot.send_message(update.effective_chat.id, tmpl)
 
+# === LIFECYCLE (Shutdown & Warm Start) ===
+
+# marshal, not pickle: the file lives on a shared volume and must never run code on load
+SNAPSHOT_VERSION = 2
+
+def save_snapshot(path: str = SNAPSHOT_PATH):
+    """Dump limiter state and pending scheduled messages to a marshal file"""
+    now = time.time()
+    spam = {}
+    for uid, history in SPAM_CACHE.items():
+        recent = [t for t in history if now - t < FLOOD_WINDOW]
+        if recent:
+            spam[uid] = recent
+    # Oldest first, so restoring in order rebuilds the LRU
+    waves = [(cid, w.dump()) for cid, w in WAVES.items() if now - max(w.times) < WAVE_WINDOW]
+    state = {
+        'version': SNAPSHOT_VERSION,
+        'saved_at': now,
+        'spam_cache': spam,
+        'waves': waves,
+        'scheduled': dict(SCHEDULED_MESSAGES)
+    }
+    # Write-then-rename so a crash never leaves a torn snapshot
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        marshal.dump(state, f)
+    os.replace(tmp, path)
+    logger.info(f"💾 Snapshot saved ({len(spam)} limiter entries, {len(waves)} chat fingerprints, {len(SCHEDULED_MESSAGES)} scheduled)")
+
+def load_snapshot(app, path: str = SNAPSHOT_PATH):
+    """Restore state written by save_snapshot, then discard the file"""
+    if not os.path.exists(path): return
+    try:
+        with open(path, 'rb') as f:
+            state = marshal.load(f)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        state = None
+    # Consume it either way; replaying twice would double-send scheduled messages
+    os.remove(path)
+    if not isinstance(state, dict) or state.get('version') != SNAPSHOT_VERSION: return
+
+    # Parse everything before applying anything, so a malformed file means a clean cold start
+    now = time.time()
+    try:
+        spam = {}
+        for uid, history in state['spam_cache'].items():
+            recent = [t for t in history if now - t < FLOOD_WINDOW]
+            if recent:
+                spam[uid] = recent
+        waves = []
+        for cid, dumped in state.get('waves', []):
+            window = FingerprintWindow.restore(dumped)
+            if window:
+                waves.append((cid, window))
+        scheduled = {
+            name: {'cid': entry['cid'], 'text': entry['text'], 'due': float(entry['due'])}
+            for name, entry in state['scheduled'].items()
+        }
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        logger.warning(f"Ignoring malformed snapshot {path}: {e!r}")
+        return
+
+    SPAM_CACHE.update(spam)
+    for cid, window in waves:
+        WAVES[cid] = window
+
+    if not app.job_queue:
+        if scheduled:
+            logger.warning(f"JobQueue not active: discarded {len(scheduled)} scheduled messages from snapshot")
+        scheduled = {}
+    for name, entry in scheduled.items():
+        data = {'cid': entry['cid'], 'text': entry['text']}
+        SCHEDULED_MESSAGES[name] = entry
+        app.job_queue.run_once(send_scheduled_message, max(entry['due'] - now, 0), data=data, name=name)
+    logger.info(f"♻️ Warm start: restored {len(waves)} chat fingerprints, {len(scheduled)} scheduled messages")
+
+# === HEARTBEAT (Liveness/Readiness for healthcheck.py) ===
+
+async def track_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Record when updates arrive and how far behind Telegram we are"""
+    now = time.time()
+    LIVENESS['last_update'] = now
+    # Only these carry a send/edit time; a callback query's message date is when the menu was sent
+    if update.message or update.channel_post:
+        sent = (update.message or update.channel_post).date
+    elif update.edited_message or update.edited_channel_post:
+        sent = (update.edited_message or update.edited_channel_post).edit_date
+    else:
+        return
+    if sent:
+        LIVENESS['update_lag'] = max(now - sent.timestamp(), 0.0)
+        LIVENESS['last_lag_sample'] = now
+
+def write_heartbeat_file(payload: dict, path: str = HEARTBEAT_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+async def heartbeat_job(context: ContextTypes.DEFAULT_TYPE):
+    """Runs on the event loop, so a fresh file proves the loop is alive"""
+    app = context.application
+    write_heartbeat_file({
+        'ts': time.time(),
+        'pid': os.getpid(),
+        'last_update': LIVENESS['last_update'],
+        'update_lag': round(LIVENESS['update_lag'], 3),
+        'last_lag_sample': LIVENESS['last_lag_sample'],
+        # With block=False the backlog lives in handler tasks, not in update_queue
+        'pending_tasks': len(asyncio.all_tasks()),
+        'jobs': len(app.job_queue.jobs()),
+        'scheduled': len(SCHEDULED_MESSAGES)
+    })
+
+async def post_shutdown(app):
+    # Fail probes immediately instead of waiting for the heartbeat to age out
+    try:
+        os.remove(HEARTBEAT_PATH)
+    except FileNotFoundError:
+        pass
+
+    try:
+        save_snapshot()
+    except Exception as e:
+        logger.error(f"Snapshot failed: {e}")
+
+    conn = getattr(app, "db_conn", None)
+    if conn:
+        # Flush anything still queued on the aiosqlite worker before closing
+        try:
+            await conn.commit()
+        finally:
+            await conn.close()
+    logger.info("🛑 DexKeeper Systems Offline")
+
 # === MAIN ===
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
+    set_log_context(update, "error_handler")
     logger.error(msg="Exception while handling an update:", exc_info=context.error)
 
 async def post_init(app):
@@ -663,10 +1099,16 @@ async def post_init(app):
     
     # Schema Init
     await conn.executescript(SCHEMA)
+    await load_settings_cache(conn)
     
     # Defaults
     if await get_setting(conn, "welcome_message") is None:
         await set_setting(conn, "welcome_message", "Welcome! Please read the rules.")
+
+    load_snapshot(app)
+
+    if app.job_queue:
+        app.job_queue.run_repeating(heartbeat_job, interval=HEARTBEAT_INTERVAL, first=0, name="heartbeat")
     
     logger.info("🚀 DexKeeper Systems Online")
 
@@ -676,7 +1118,11 @@ def main():
         return
 
     defaults = Defaults(parse_mode='Markdown', block=False)
-    app = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).defaults(defaults).build()
+    app = (
+        ApplicationBuilder().token(BOT_TOKEN)
+        .post_init(post_init).post_shutdown(post_shutdown)
+        .defaults(defaults).build()
+    )
     
     # Admin System
     admin_handler = ConversationHandler(
@@ -698,6 +1144,7 @@ def main():
         name="admin_gui"
     )
     
+    app.add_handler(TypeHandler(Update, track_update), group=-1)
     app.add_handler(admin_handler)
     
     # Module B: Join Logic
@@ -705,8 +1152,8 @@ def main():
     app.add_handler(CallbackQueryHandler(verify_callback, pattern=r"^verify:"))
     
     # Module A: Global Middleware (Flood/Filter/Zoom)
-    app.add_handler(MessageHandler(filters.TEXT & filters.ChatType.GROUPS, global_middleware), group=1)
-    app.add_handler(MessageHandler(filters.TEXT & filters.ChatType.GROUPS, handle_zoom_message), group=2)
+    app.add_handler(MessageHandler(SCANNABLE, global_middleware), group=1)
+    app.add_handler(MessageHandler(SCANNABLE, handle_zoom_message), group=2)
     
     # Helpers
     app.add_error_handler(error_handler)
@@ -1,33 +1,48 @@
 import sys
-import sqlite3
+import json
+import time
 import os
 
 # Check the default path inside container
 DB_PATH = os.getenv("DB_PATH", "/app/data/dexkeeper.db")
 
-def check_health():
-    if not os.path.exists(DB_PATH):
-        print(f"Healthcheck failed: Database not found at {DB_PATH}")
-        sys.exit(1)
-        
+# Heartbeat written by the bot's event loop (see heartbeat_job in dexkeeper_bot.py)
+HEARTBEAT_PATH = os.getenv("HEARTBEAT_PATH", os.path.join(os.path.dirname(DB_PATH), "dexkeeper.heartbeat"))
+MAX_AGE = float(os.getenv("HEALTH_MAX_AGE", "30"))          # Seconds since last heartbeat
+MAX_LAG = float(os.getenv("HEALTH_MAX_LAG", "60"))          # Seconds behind Telegram (readiness)
+MAX_PENDING = int(os.getenv("HEALTH_MAX_PENDING", "200"))   # Unfinished asyncio tasks (readiness)
+
+def check_health(ready=False):
+    # Liveness: the loop keeps rewriting the file. Readiness: it also keeps up.
     try:
-        # Read-only check
-        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, timeout=5)
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM settings LIMIT 1;")
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            print("Healthcheck passed")
-            sys.exit(0)
-        else:
-            print("Healthcheck failed: No data returned from settings")
-            sys.exit(1)
-            
+        with open(HEARTBEAT_PATH) as f:
+            beat = json.load(f)
+    except FileNotFoundError:
+        print(f"Healthcheck failed: Heartbeat not found at {HEARTBEAT_PATH}")
+        sys.exit(1)
     except Exception as e:
         print(f"Healthcheck failed: {e}")
         sys.exit(1)
 
+    now = time.time()
+    age = now - beat.get("ts", 0)
+    if age > MAX_AGE:
+        print(f"Healthcheck failed: Heartbeat is {age:.0f}s old")
+        sys.exit(1)
+
+    if ready:
+        # Lag only counts while it is fresh; a quiet chat (or only button presses) is not a slow bot
+        recent = now - beat.get("last_lag_sample", 0) < MAX_AGE
+        if recent and beat.get("update_lag", 0) > MAX_LAG:
+            print(f"Healthcheck failed: Update lag {beat['update_lag']:.0f}s")
+            sys.exit(1)
+        if beat.get("pending_tasks", 0) > MAX_PENDING:
+            print(f"Healthcheck failed: {beat['pending_tasks']} tasks pending")
+            sys.exit(1)
+
+    print(f"Healthcheck passed (age {age:.1f}s, lag {beat.get('update_lag', 0):.1f}s, "
+          f"pending {beat.get('pending_tasks', 0)}, jobs {beat.get('jobs', 0)})")
+    sys.exit(0)
+
 if __name__ == "__main__":
-    check_health()
+    check_health(ready="--ready" in sys.argv[1:])
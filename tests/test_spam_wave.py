@@ -0,0 +1,27 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The bot module pulls in its runtime dependencies at import time
+pytest.importorskip("telegram")
+pytest.importorskip("aiosqlite")
+pytest.importorskip("dotenv")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Sources", "DexKeeper_Bot"))
+import dexkeeper_bot as bot
+
+
+def test_wave_on_full_ring_deletes_evicted_copy_once():
+    window = bot.FingerprintWindow(size=3)
+    now = time.time()
+    # Fill the ring with copies from three senders, below the threshold
+    for n, msg_id in enumerate((101, 102, 103)):
+        assert window.observe(0xABCD, user_id=n + 1, msg_id=msg_id, now=now, min_users=99) == []
+
+    # The next copy lands on slot 0, which still holds msg 101
+    doomed = window.observe(0xABCD, user_id=4, msg_id=104, now=now, min_users=3)
+
+    assert sorted(doomed) == [101, 102, 103, 104]
+    assert len(doomed) == len(set(doomed))